@@ -3,16 +3,28 @@ An RFC8771-compliant implementation of the Internationalized Deliberately Unread
 """
 
 
+import abc
 import collections
+import concurrent.futures
 import functools
+import hashlib
+import heapq
+import hmac
 import ipaddress
 import itertools
+import multiprocessing
+import os
+import pickle
 import random
+import sys
+import threading
+import time
+import weakref
 
 from . import data
 
 
-__all__ = ['encode', 'decode']
+__all__ = ['PackingGraph', 'PatternMatcher', 'Candidate', 'SearchBudgetExceeded', 'register_constraint', 'register_level', 'cache_info', 'configure_cache', 'clear_cache', 'constraint_info', 'constraint_order', 'clear_constraint_stats', 'can_encode', 'count_representations', 'count_valid', 'encode', 'encode_all_levels', 'encode_many', 'encode_parallel', 'decode']
 
 
 __version__ = '0.1.3'
@@ -21,15 +33,352 @@ __version__ = '0.1.3'
 utf8_lengths = [(0, 7), (8, 11), (12, 16), (17, 21)]
 
 
+EncodeResult = collections.namedtuple('EncodeResult', ['addr', 'i_dunno', 'error'])
+
+
+class SearchBudgetExceeded(ValueError):
+    """
+    Raised when encoding gives up after exhausting its max_candidates or timeout budget, rather than after proving that no valid I-DUNNO exists.
+    The number of partial candidates examined, the number of packings whose validity was decided out of the total, and the elapsed seconds are kept as attributes.
+    """
+    def __init__(self, candidates, covered, total, elapsed):
+        super().__init__(f'search budget exhausted after examining {candidates} candidates covering {covered} of {total} packings in {elapsed:.3f}s')
+
+        self.candidates = candidates
+        self.covered = covered
+        self.total = total
+        self.elapsed = elapsed
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton that finds whether any of a set of substrings occurs in a string in one linear pass.
+    The automaton can also be driven one code point at a time with step() starting from the root state 0.
+    """
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [False]
+
+        for pattern in patterns:
+            state = 0
+
+            for char in pattern:
+                num = ord(char)
+
+                if num not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(False)
+                    self.goto[state][num] = len(self.goto) - 1
+
+                state = self.goto[state][num]
+
+            self.output[state] = True
+
+        queue = collections.deque(self.goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for num, target in self.goto[state].items():
+                queue.append(target)
+
+                fallback = self.fail[state]
+                while fallback and num not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+
+                self.fail[target] = self.goto[fallback].get(num, 0)
+                self.output[target] = self.output[target] or self.output[self.fail[target]]
+
+    def step(self, state, num):
+        while state and num not in self.goto[state]:
+            state = self.fail[state]
+
+        return self.goto[state].get(num, 0)
+
+    def matched(self, state):
+        return self.output[state]
+
+    def search(self, string):
+        state = 0
+
+        if self.output[state]:
+            return True
+
+        for char in string:
+            state = self.step(state, ord(char))
+
+            if self.output[state]:
+                return True
+
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def data_matcher(name):
+    return PatternMatcher(getattr(data, name))
+
+
+class Candidate(bytes):
+    """
+    Candidate I-DUNNO byte string that is decoded only once and remembers the result of every constraint and confusion level checked against it.
+    It is still a byte string, so it can be passed to any constraint function.
+    """
+    def __new__(cls, bytestr):
+        candidate = super().__new__(cls, bytestr)
+
+        candidate.string = candidate.decode('utf-8')
+        candidate.code_points = [ord(char) for char in candidate.string]
+        candidate.results = {}
+        candidate.level_results = {}
+
+        return candidate
+
+    def satisfies(self, constraint):
+        if constraint not in self.results:
+            self.results[constraint] = bool(constraint(self))
+
+        return self.results[constraint]
+
+
+def code_points(bytestr):
+    if isinstance(bytestr, Candidate):
+        return bytestr.code_points
+
+    return [ord(char) for char in bytestr.decode('utf-8')]
+
+
+SATISFIED = -1
+
+
+class MaskTable:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __getitem__(self, num):
+        return 1 << self.ids[num]
+
+
+@functools.lru_cache(maxsize=None)
+def column_masks(column):
+    return MaskTable(getattr(data.code_point_table(), column))
+
+
+class PredicateTable(dict):
+    """
+    Lazy per-code-point table of a character predicate, where each code point is looked up as 1 or 0 the first time it is needed.
+    """
+    def __init__(self, predicate):
+        super().__init__()
+        self.predicate = predicate
+
+    def __missing__(self, num):
+        value = self[num] = 1 if self.predicate(chr(num)) else 0
+        return value
+
+
+class KeyTable(dict):
+    """
+    Lazy per-code-point table of a character key function, where each distinct key is interned as a small integer id the first time it is seen.
+    """
+    def __init__(self, key):
+        super().__init__()
+        self.key = key
+        self.interned = {}
+
+    def __missing__(self, num):
+        value = self[num] = self.interned.setdefault(self.key(chr(num)), len(self.interned))
+        return value
+
+
+class Constraint(abc.ABC):
+    """
+    Confusion constraint that can be evaluated incrementally, one code point at a time.
+    States are small integers, with SATISFIED marking a constraint that stays satisfied however the string continues.
+    Calling a constraint with a byte string evaluates it on the whole string.
+    """
+    initial = 0
+
+    def __getstate__(self):
+        return {name: value for name, value in self.__dict__.items() if not isinstance(getattr(type(self), name, None), functools.cached_property)}
+
+    def __call__(self, bytestr):
+        state = self.initial
+
+        for num in code_points(bytestr):
+            state = self.advance(state, num)
+
+        return state == SATISFIED
+
+    @abc.abstractmethod
+    def advance(self, state, num):
+        pass
+
+    def bounds(self, graph, unions=None):
+        return None
+
+    def possible(self, state, bounds, offset):
+        return True
+
+
+class FlagConstraint(Constraint):
+    """
+    Satisfied once any character has the given flag in data.code_point_table().
+    """
+    def __init__(self, flag):
+        self.flag = flag
+
+    @functools.cached_property
+    def flags(self):
+        return data.code_point_table().flags
+
+    def advance(self, state, num):
+        if self.flags[num] & self.flag:
+            return SATISFIED
+
+        return state
+
+    def bounds(self, graph, unions=None):
+        return graph.suffix_union(self.flags, unions)
+
+    def possible(self, state, bounds, offset):
+        return state == SATISFIED or bounds[offset] & self.flag
+
+
+class DistinctConstraint(Constraint):
+    """
+    Satisfied once the characters have at least the given number of distinct ids in a column of data.code_point_table().
+    """
+    def __init__(self, column, minimum=2):
+        self.column = column
+        self.minimum = minimum
+
+    @functools.cached_property
+    def ids(self):
+        return getattr(data.code_point_table(), self.column)
+
+    @functools.cached_property
+    def masks(self):
+        return column_masks(self.column)
+
+    def advance(self, state, num):
+        if state == SATISFIED:
+            return state
+
+        state |= 1 << self.ids[num]
+
+        if bin(state).count('1') >= self.minimum:
+            return SATISFIED
+
+        return state
+
+    def bounds(self, graph, unions=None):
+        return graph.suffix_union(self.masks, unions)
+
+    def possible(self, state, bounds, offset):
+        return state == SATISFIED or bin(state | bounds[offset]).count('1') >= self.minimum
+
+
+class PatternConstraint(Constraint):
+    """
+    Satisfied once the string contains any of the substrings in a set from the data module.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    @functools.cached_property
+    def matcher(self):
+        return data_matcher(self.name)
+
+    @property
+    def initial(self):
+        return SATISFIED if self.matcher.matched(0) else 0
+
+    def advance(self, state, num):
+        if state == SATISFIED:
+            return state
+
+        state = self.matcher.step(state, num)
+
+        if self.matcher.matched(state):
+            return SATISFIED
+
+        return state
+
+    def bounds(self, graph, unions=None):
+        return [offset < graph.bits for offset in range(graph.bits + 1)]
+
+    def possible(self, state, bounds, offset):
+        return state == SATISFIED or bounds[offset]
+
+
+class PredicateConstraint(FlagConstraint):
+    """
+    Satisfied once any character passes a character predicate.
+    """
+    def __init__(self, predicate):
+        super().__init__(1)
+        self.predicate = predicate
+
+    @functools.cached_property
+    def flags(self):
+        return PredicateTable(self.predicate)
+
+
+class KeyConstraint(DistinctConstraint):
+    """
+    Satisfied once the characters have at least the given number of distinct values of a character key function.
+    """
+    def __init__(self, key, minimum=2):
+        super().__init__(None, minimum)
+        self.key = key
+
+    @functools.cached_property
+    def ids(self):
+        return KeyTable(self.key)
+
+    @functools.cached_property
+    def masks(self):
+        return MaskTable(self.ids)
+
+
+class PatternSetConstraint(PatternConstraint):
+    """
+    Satisfied once the string contains any of the given substrings.
+    """
+    def __init__(self, patterns):
+        super().__init__(None)
+        self.patterns = frozenset(patterns)
+
+    @functools.cached_property
+    def matcher(self):
+        return PatternMatcher(self.patterns)
+
+
+class OpaqueConstraint(Constraint):
+    """
+    Wrapper for a plain constraint function, which can only be evaluated once the whole string is known.
+    """
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, bytestr):
+        return self.function(bytestr)
+
+    def advance(self, state, num):
+        return state
+
+
 confusion_constraints = {
-    'multi-octet': lambda bytestr: any(num >= 0b11000000 for num in bytestr),
-    'disallowed': lambda bytestr: any(char in data.idna_disallowed for char in bytestr.decode('utf-8')),
-    'non-printable': lambda bytestr: any(not char.isprintable() for char in bytestr.decode('utf-8')),
-    'multiple-scripts': lambda bytestr: len({data.character_script(char) for char in bytestr.decode('utf-8')}) > 1,
-    'category-symbol': lambda bytestr: any(char in data.category_symbols for char in bytestr.decode('utf-8')),
-    'multiple-directionalities': lambda bytestr: len({data.character_bidi(char) for char in bytestr.decode('utf-8')}) > 1,
-    'confusables': lambda bytestr: (lambda string: any(confusable in string for confusable in data.confusables))(bytestr.decode('utf-8')),
-    'emoji': lambda bytestr: (lambda string: any(emoji in string for emoji in data.emoji))(bytestr.decode('utf-8')),
+    'multi-octet': FlagConstraint(data.MULTI_OCTET),
+    'disallowed': FlagConstraint(data.DISALLOWED),
+    'non-printable': FlagConstraint(data.NON_PRINTABLE),
+    'multiple-scripts': DistinctConstraint('scripts'),
+    'category-symbol': FlagConstraint(data.SYMBOL),
+    'multiple-directionalities': DistinctConstraint('bidi'),
+    'confusables': PatternConstraint('confusables'),
+    'emoji': PatternConstraint('emoji'),
 }
 
 
@@ -52,6 +401,71 @@ confusion_levels = collections.OrderedDict([
 ])
 
 
+constraint_kinds = {
+    'flag': PredicateConstraint,
+    'distinct': KeyConstraint,
+    'pattern': PatternSetConstraint,
+    'opaque': OpaqueConstraint,
+}
+
+
+def register_constraint(name, kind, definition, minimum=None):
+    """
+    Register a named confusion constraint for use in confusion levels, declaring its kind so that it is evaluated incrementally like the built-in constraints.
+    A 'flag' constraint is satisfied once any character passes definition, a predicate on single characters.
+    A 'distinct' constraint is satisfied once definition, a key function on single characters, gives at least minimum (by default, 2) distinct values.
+    A 'pattern' constraint is satisfied once the string contains any of the substrings in definition, an iterable of strings other than a single string.
+    An 'opaque' constraint is satisfied if definition, a function on the whole I-DUNNO byte string, returns true, and is only evaluated once the whole string is known.
+    A ValueError is raised if the name is already registered, the kind does not exist, a 'pattern' definition is a single string, or minimum is given for a kind other than 'distinct'.
+    """
+    if name in confusion_constraints:
+        raise ValueError(f'confusion constraint already registered: {name}')
+
+    if kind not in constraint_kinds:
+        raise ValueError(f'unknown constraint kind: {kind}')
+
+    if kind == 'pattern' and isinstance(definition, str):
+        raise ValueError(f'pattern constraint needs a collection of substrings, not a single string: {name}')
+
+    if kind != 'distinct' and minimum is not None:
+        raise ValueError(f'minimum only applies to distinct constraints: {name}')
+
+    if kind == 'distinct':
+        constraint = KeyConstraint(definition, 2 if minimum is None else minimum)
+    else:
+        constraint = constraint_kinds[kind](definition)
+
+    confusion_constraints[name] = constraint
+
+    return constraint
+
+
+def register_level(name, constraints, required=2, inherit=()):
+    """
+    Register a named confusion level that is reached when at least required of the named constraints are satisfied and every inherited level is reached.
+    A ValueError is raised if the name is already registered, a constraint or inherited level does not exist, or more constraints are required than are named.
+    """
+    if name in confusion_levels:
+        raise ValueError(f'confusion level already registered: {name}')
+
+    for constraint in constraints:
+        if constraint not in confusion_constraints:
+            raise ValueError(f'unknown confusion constraint: {constraint}')
+
+    for inherited_level in inherit:
+        if inherited_level not in confusion_levels:
+            raise ValueError(f'unknown confusion level: {inherited_level}')
+
+    if required > len(constraints):
+        raise ValueError(f'confusion level requires {required} of only {len(constraints)} constraints: {name}')
+
+    confusion_levels[name] = {
+        'required': required,
+        'constraints': tuple(constraints),
+        'inherit': tuple(inherit),
+    }
+
+
 def int_to_bits(num, length=8):
     return list(1 if num & (1 << idx) else 0 for idx in range(length - 1, -1, -1))
 
@@ -65,73 +479,1213 @@ def bits_to_bytes(bits):
     return bytes(sum(bit << (7 - idx) for idx, bit in enumerate(aligned_bits[sidx:sidx + 8])) for sidx in range(0, len(aligned_bits), 8))
 
 
-@functools.lru_cache
+def bits_to_int(bits):
+    num = 0
+
+    for bit in bits:
+        num = (num << 1) | bit
+
+    return num
+
+
+class PackingGraph:
+    """
+    Directed acyclic graph of every way to pack the bits of an integer of the given width into UTF-8 code points.
+    Nodes are bit offsets and edges are valid code points, so every path from offset 0 to offset bits is one I-DUNNO packing.
+    Only nodes and edges that lie on at least one complete path are kept.
+    """
+    def __init__(self, value, bits, lengths=tuple(utf8_lengths)):
+        self.value = value
+        self.bits = bits
+        self.lengths = lengths
+
+        edges = [() for _ in range(bits + 1)]
+        counts = [0] * (bits + 1)
+        counts[bits] = 1
+
+        for offset in range(bits - 1, -1, -1):
+            offset_edges = []
+
+            for minimum, length in lengths:
+                if bits - offset < length or not counts[offset + length]:
+                    continue
+
+                val = (value >> (bits - offset - length)) & ((1 << length) - 1)
+
+                if minimum > 0 and val < (1 << minimum):
+                    continue
+
+                try:
+                    part = chr(val).encode('utf-8')
+                except (ValueError, UnicodeEncodeError):
+                    continue
+
+                offset_edges.append((offset + length, val, part))
+                counts[offset] += counts[offset + length]
+
+            edges[offset] = tuple(offset_edges)
+
+        reachable = [False] * (bits + 1)
+        reachable[0] = counts[0] > 0
+
+        for offset in range(bits):
+            if not reachable[offset]:
+                edges[offset] = ()
+                counts[offset] = 0
+                continue
+
+            for target, num, part in edges[offset]:
+                reachable[target] = True
+
+        if not reachable[bits]:
+            counts[bits] = 0
+
+        self.edges = tuple(edges)
+        self.counts = tuple(counts)
+
+    @property
+    def approximate_size(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self.edges) + sys.getsizeof(self.counts)
+
+        for offset_edges in self.edges:
+            size += sys.getsizeof(offset_edges)
+
+            for edge in offset_edges:
+                size += sum(sys.getsizeof(item) for item in edge) + sys.getsizeof(edge)
+
+        for count in self.counts:
+            size += sys.getsizeof(count)
+
+        return size
+
+    def suffix_union(self, values, unions=None):
+        """
+        For each offset, bitwise OR together values[num] for every code point num on any path from that offset to the end.
+        If unions (a dict) is given, results are memoized in it per values table, so that constraints sharing a table compute it once.
+        """
+        key = id(values)
+
+        if unions is not None and key in unions:
+            return unions[key][1]
+
+        union = [0] * (self.bits + 1)
+
+        for offset in range(self.bits - 1, -1, -1):
+            for target, num, part in self.edges[offset]:
+                union[offset] |= values[num] | union[target]
+
+        if unions is not None:
+            unions[key] = (values, union)
+
+        return union
+
+    def suffix_lengths(self, best=min):
+        """
+        For each offset, the best (by default, smallest) number of UTF-8 bytes of any packing of the bits from that offset onwards, or None if there is none.
+        """
+        lengths = [None] * (self.bits + 1)
+        lengths[self.bits] = 0
+
+        for offset in range(self.bits - 1, -1, -1):
+            if self.edges[offset]:
+                lengths[offset] = best(len(part) + lengths[target] for target, num, part in self.edges[offset])
+
+        return lengths
+
+    def best_path(self, lengths, offset=0):
+        """
+        Return the first packing of the bits from offset onwards in paths() order whose UTF-8 length matches the given suffix_lengths().
+        """
+        bytestr = b''
+
+        while offset < self.bits:
+            for target, num, part in self.edges[offset]:
+                if len(part) + lengths[target] == lengths[offset]:
+                    offset = target
+                    bytestr += part
+                    break
+
+        return bytestr
+
+    @property
+    def node_count(self):
+        return sum(1 for count in self.counts if count)
+
+    @property
+    def edge_count(self):
+        return sum(len(offset_edges) for offset_edges in self.edges)
+
+    @property
+    def path_count(self):
+        return self.counts[0]
+
+    def paths(self, shuffle=None, offset=0):
+        """
+        Lazily yield every packing as a UTF-8 byte string, depth-first in order of the configured lengths.
+        If shuffle is given, it is called on the list of outgoing edges at each node before descending.
+        If offset is given, only the packings of the bits from that offset onwards are yielded.
+        """
+        def walk(offset):
+            if offset == self.bits:
+                yield b''
+                return
+
+            choices = list(self.edges[offset])
+            if shuffle is not None:
+                shuffle(choices)
+
+            for target, num, part in choices:
+                for combination in walk(target):
+                    yield part + combination
+
+        if not self.counts[offset]:
+            return iter(())
+
+        return walk(offset)
+
+    def unrank(self, index, offset=0):
+        """
+        Return the packing at the given position of the unshuffled paths() order without enumerating the ones before it.
+        If offset is given, the packing of the bits from that offset onwards is returned instead.
+        A ValueError is raised if the index is out of range.
+        """
+        if not 0 <= index < self.counts[offset]:
+            raise ValueError(f'packing index out of range: {index}')
+
+        bytestr = b''
+
+        while offset < self.bits:
+            for target, num, part in self.edges[offset]:
+                if index < self.counts[target]:
+                    offset = target
+                    bytestr += part
+                    break
+
+                index -= self.counts[target]
+
+        return bytestr
+
+
+class ConfusionPlan:
+    """
+    Confusion level compiled into the constraints it needs and the required counts of every level it inherits.
+    Constraints named in track are evaluated as well, even if the level does not need them, so that they can be scored.
+    A ValueError is raised if the confusion level does not exist.
+    """
+    def __init__(self, level, levels=confusion_levels, constraints=confusion_constraints, track=()):
+        if level not in levels:
+            raise ValueError(f'unknown confusion level: {level}')
+
+        self.level = level
+        self.source = levels
+
+        names = []
+
+        for name in self.closure(level):
+            for constraint in levels[name]['constraints']:
+                if constraint not in names:
+                    names.append(constraint)
+
+        for constraint in track:
+            if constraint not in names:
+                names.append(constraint)
+
+        self.names = tuple(names)
+        self.constraints = tuple(constraints[name] if isinstance(constraints[name], Constraint) else OpaqueConstraint(constraints[name]) for name in names)
+        self.opaque = tuple(idx for idx, constraint in enumerate(self.constraints) if isinstance(constraint, OpaqueConstraint))
+        self.levels = self.requirements(level)
+
+    def closure(self, level):
+        order = []
+        seen = set()
+
+        def visit(name):
+            if name in seen:
+                return
+
+            seen.add(name)
+
+            for inherited_level in self.source[name]['inherit']:
+                visit(inherited_level)
+
+            order.append(name)
+
+        visit(level)
+
+        return order
+
+    def requirements(self, level):
+        """
+        Return the required count and constraint indices of the given level and every level it inherits, all of whose constraints must be evaluated by this plan.
+        """
+        return tuple((self.source[name]['required'], tuple(self.names.index(constraint) for constraint in self.source[name]['constraints'])) for name in self.closure(level))
+
+    def start(self):
+        return tuple(constraint.initial for constraint in self.constraints)
+
+    def advance(self, states, num):
+        return tuple(constraint.advance(state, num) for constraint, state in zip(self.constraints, states))
+
+    def settled(self, states, levels=None):
+        return all(sum(1 for idx in indices if states[idx] == SATISFIED) >= required for required, indices in levels or self.levels)
+
+    def satisfied(self, states, bytestr):
+        candidate = Candidate(bytestr)
+
+        satisfied = [state == SATISFIED for state in states]
+        for idx in self.opaque:
+            satisfied[idx] = candidate.satisfies(self.constraints[idx].function)
+
+        return satisfied
+
+    def accepts(self, states, bytestr, levels=None):
+        satisfied = self.satisfied(states, bytestr)
+
+        return all(sum(1 for idx in indices if satisfied[idx]) >= required for required, indices in levels or self.levels)
+
+
+class ConfusionSearch:
+    """
+    Search over the paths of a PackingGraph for packings that satisfy a compiled ConfusionPlan.
+    Constraint states are carried along as each code point is appended, so branches that can no longer reach the level are pruned and branches that already satisfy it are completed without further checks.
+    """
+    def __init__(self, graph, plan, max_candidates=None, deadline=None):
+        self.graph = graph
+        self.plan = plan
+        self.unions = {}
+        self.bounds = tuple(constraint.bounds(graph, self.unions) for constraint in plan.constraints)
+
+        self.max_candidates = max_candidates
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.explored = 0
+        self.covered = 0
+        self.memo = {}
+
+    def visit(self):
+        if (self.max_candidates is not None and self.explored >= self.max_candidates) or (self.deadline is not None and time.monotonic() > self.deadline):
+            raise SearchBudgetExceeded(self.explored, min(self.covered, self.graph.path_count), self.graph.path_count, time.monotonic() - self.started)
+
+        self.explored += 1
+
+    def viable(self, states, offset, levels=None):
+        for required, indices in levels or self.plan.levels:
+            possible = 0
+
+            for idx in indices:
+                if self.plan.constraints[idx].possible(states[idx], self.bounds[idx], offset):
+                    possible += 1
+
+            if possible < required:
+                return False
+
+        return True
+
+    def regions(self, shuffle=None):
+        """
+        Lazily yield (prefix, offset) pairs, depth-first in the same order as PackingGraph.paths(), where every packing of the bits from offset onwards completes prefix into a packing that satisfies the confusion level.
+        Without opaque constraint functions, (offset, states) pairs found to yield nothing are remembered, so that infeasible levels are proven without walking every packing.
+        """
+        dead = set()
+
+        def walk(offset, states, prefix):
+            self.visit()
+
+            if not self.viable(states, offset) or (offset, states) in dead:
+                self.covered += self.graph.counts[offset]
+                return
+
+            if self.plan.settled(states):
+                self.covered += self.graph.counts[offset]
+                yield prefix, offset
+                return
+
+            if offset == self.graph.bits:
+                self.covered += 1
+                if self.plan.accepts(states, prefix):
+                    yield prefix, offset
+                return
+
+            choices = list(self.graph.edges[offset])
+            if shuffle is not None:
+                shuffle(choices)
+
+            found = False
+
+            for target, num, part in choices:
+                for region in walk(target, self.plan.advance(states, num), prefix + part):
+                    found = True
+                    yield region
+
+            if not found and not self.plan.opaque:
+                dead.add((offset, states))
+
+        if not self.graph.path_count:
+            return iter(())
+
+        return walk(0, self.plan.start(), b'')
+
+    def candidates(self, shuffle=None):
+        """
+        Lazily yield every packing that satisfies the confusion level, depth-first in the same order as PackingGraph.paths().
+        """
+        for prefix, offset in self.regions(shuffle):
+            for suffix in self.graph.paths(shuffle, offset):
+                yield prefix + suffix
+
+    def first(self, shuffle=None):
+        """
+        Return the first packing that satisfies the confusion level in candidates() order, or None if there is none.
+        """
+        return next(self.candidates(shuffle), None)
+
+    def completions(self, offset, states):
+        """
+        Count the packings of the bits from offset onwards that complete a prefix with the given constraint states into a packing that satisfies the confusion level.
+        Counts are memoized per (offset, states) pair, so this is dynamic programming over the product of the packing graph and the constraint automata.
+        The packings from offset onwards are counted as covered whenever a result is reused or decided without looking further.
+        Plans with opaque constraint functions depend on the whole string and cannot be counted this way.
+        """
+        if (offset, states) in self.memo:
+            self.covered += self.graph.counts[offset]
+        else:
+            self.visit()
+
+            if not self.viable(states, offset):
+                count = 0
+                self.covered += self.graph.counts[offset]
+            elif self.plan.settled(states):
+                count = self.graph.counts[offset]
+                self.covered += count
+            elif offset == self.graph.bits:
+                count = 0
+                self.covered += 1
+            else:
+                count = sum(self.completions(target, self.plan.advance(states, num)) for target, num, part in self.graph.edges[offset])
+
+            self.memo[(offset, states)] = count
+
+        return self.memo[(offset, states)]
+
+    def count(self):
+        """
+        Count the packings that satisfy the confusion level.
+        """
+        if self.plan.opaque:
+            return sum(self.graph.counts[offset] for prefix, offset in self.regions())
+
+        if not self.graph.path_count:
+            return 0
+
+        return self.completions(0, self.plan.start())
+
+    def unrank(self, index):
+        """
+        Return the packing at the given position of the candidates() order without enumerating the packings before it.
+        A ValueError is raised if the index is out of range.
+        """
+        if self.plan.opaque:
+            if index >= 0:
+                for prefix, offset in self.regions():
+                    if index < self.graph.counts[offset]:
+                        return prefix + self.graph.unrank(index, offset)
+
+                    index -= self.graph.counts[offset]
+
+            raise ValueError('candidate index out of range')
+
+        if not 0 <= index < self.count():
+            raise ValueError('candidate index out of range')
+
+        offset = 0
+        states = self.plan.start()
+        bytestr = b''
+
+        while not self.plan.settled(states):
+            for target, num, part in self.graph.edges[offset]:
+                next_states = self.plan.advance(states, num)
+                count = self.completions(target, next_states)
+
+                if index < count:
+                    offset = target
+                    states = next_states
+                    bytestr += part
+                    break
+
+                index -= count
+
+        return bytestr + self.graph.unrank(index, offset)
+
+    def optimum(self, best=min):
+        """
+        Return the valid packing with the best (by default, smallest) UTF-8 length, or None if there is none, breaking ties by the smallest bytes.
+        This is an A* search over (offset, constraint states) pairs using the best suffix lengths of the graph as an optimistic estimate of the remaining length.
+        """
+        lengths = self.graph.suffix_lengths(best)
+        sign = 1 if best is min else -1
+
+        if not self.graph.path_count:
+            return None
+
+        queue = [(sign * lengths[0], b'', 0, self.plan.start())]
+        seen = set()
+
+        while queue:
+            estimate, prefix, offset, states = heapq.heappop(queue)
+
+            self.visit()
+
+            if self.plan.settled(states):
+                return prefix + self.graph.best_path(lengths, offset)
+
+            if offset == self.graph.bits:
+                self.covered += 1
+                if self.plan.accepts(states, prefix):
+                    return prefix
+                continue
+
+            if not self.plan.opaque:
+                if (offset, states) in seen:
+                    continue
+
+                seen.add((offset, states))
+
+            for target, num, part in self.graph.edges[offset]:
+                next_states = self.plan.advance(states, num)
+
+                if self.viable(next_states, target):
+                    heapq.heappush(queue, (sign * (len(prefix) + len(part) + lengths[target]), prefix + part, target, next_states))
+                else:
+                    self.covered += self.graph.counts[target]
+
+        return None
+
+    def classify(self, requirements):
+        """
+        Return a LevelClasses counting the packings whose last reached level is each of the given level requirements (as returned by ConfusionPlan.requirements), all at once.
+        This requires a plan without opaque constraint functions.
+        """
+        return LevelClasses(self, requirements)
+
+    def maximum(self):
+        """
+        Return the valid packing that satisfies the most constraints of the plan, or None if there is none, breaking ties by the smallest bytes.
+        This is a depth-first branch-and-bound search in code point order, where a branch is cut as soon as the constraints it has satisfied plus those its suffix bounds still allow cannot beat the best packing found so far.
+        """
+        best = None
+        best_score = -1
+        explored = set()
+
+        def walk(offset, states, prefix):
+            nonlocal best, best_score
+
+            self.visit()
+
+            if not self.viable(states, offset):
+                self.covered += self.graph.counts[offset]
+                return
+
+            score = sum(1 for state in states if state == SATISFIED)
+            bound = sum(1 for idx, constraint in enumerate(self.plan.constraints) if constraint.possible(states[idx], self.bounds[idx], offset))
+
+            if bound <= best_score:
+                self.covered += self.graph.counts[offset]
+                return
+
+            if score == bound and self.plan.settled(states):
+                self.covered += self.graph.counts[offset]
+                best = prefix + self.graph.unrank(0, offset)
+                best_score = score
+                return
+
+            if offset == self.graph.bits:
+                self.covered += 1
+
+                if self.plan.accepts(states, prefix):
+                    score = sum(self.plan.satisfied(states, prefix))
+
+                    if score > best_score:
+                        best = prefix
+                        best_score = score
+                return
+
+            if not self.plan.opaque:
+                if (offset, states) in explored:
+                    return
+
+                explored.add((offset, states))
+
+            choices = list(self.graph.edges[offset])
+            canonical_order(choices)
+
+            for target, num, part in choices:
+                walk(target, self.plan.advance(states, num), prefix + part)
+
+                if best_score == len(self.plan.constraints):
+                    return
+
+        if self.graph.path_count:
+            walk(0, self.plan.start(), b'')
+
+        return best
+
+    def sample(self, rng=random):
+        """
+        Return a uniformly random packing that satisfies the confusion level, or None if there is none.
+        Without opaque constraint functions, this unranks a uniformly random index below count().
+        Otherwise, regions are streamed through weighted reservoir sampling, so only the chosen one is held in memory.
+        """
+        if not self.plan.opaque:
+            count = self.count()
+            return self.unrank(rng.randrange(count)) if count else None
+
+        chosen = None
+        total = 0
+
+        for prefix, offset in self.regions():
+            weight = self.graph.counts[offset]
+            total += weight
+
+            if rng.randrange(total) < weight:
+                chosen = (prefix, offset)
+
+        if chosen is None:
+            return None
+
+        prefix, offset = chosen
+
+        return prefix + self.graph.unrank(rng.randrange(self.graph.counts[offset]), offset)
+
+
+class LevelClasses:
+    """
+    Counts of the packings of a ConfusionSearch whose last reached level is each of a list of level requirements, in counts.
+    This is the same dynamic programming as ConfusionSearch.completions(), with a vector of counts per (offset, states) pair.
+    """
+    def __init__(self, search, requirements):
+        self.search = search
+        self.requirements = requirements
+        self.memo = {}
+
+        if search.graph.path_count:
+            self.counts = self.completions(0, search.plan.start())
+        else:
+            self.counts = (0,) * len(requirements)
+
+    def completions(self, offset, states):
+        search = self.search
+
+        if (offset, states) in self.memo:
+            search.covered += search.graph.counts[offset]
+        else:
+            search.visit()
+
+            viable = [idx for idx, levels in enumerate(self.requirements) if search.viable(states, offset, levels)]
+            counts = [0] * len(self.requirements)
+
+            if not viable:
+                search.covered += search.graph.counts[offset]
+            elif viable[-1] == len(self.requirements) - 1 and search.plan.settled(states, self.requirements[-1]):
+                counts[-1] = search.graph.counts[offset]
+                search.covered += counts[-1]
+            elif offset == search.graph.bits:
+                search.covered += 1
+
+                for idx in reversed(viable):
+                    if search.plan.settled(states, self.requirements[idx]):
+                        counts[idx] = 1
+                        break
+            else:
+                for target, num, part in search.graph.edges[offset]:
+                    for idx, count in enumerate(self.completions(target, search.plan.advance(states, num))):
+                        counts[idx] += count
+
+            self.memo[(offset, states)] = tuple(counts)
+
+        return self.memo[(offset, states)]
+
+    def unrank(self, level, index):
+        """
+        Return the packing at the given position of the ConfusionSearch.candidates() order among those whose last reached level is the given index into the requirements.
+        A ValueError is raised if the index is out of range.
+        """
+        if not 0 <= index < self.counts[level]:
+            raise ValueError('candidate index out of range')
+
+        search = self.search
+        offset = 0
+        states = search.plan.start()
+        bytestr = b''
+
+        while offset < search.graph.bits:
+            if level == len(self.requirements) - 1 and search.plan.settled(states, self.requirements[-1]):
+                return bytestr + search.graph.unrank(index, offset)
+
+            for target, num, part in search.graph.edges[offset]:
+                next_states = search.plan.advance(states, num)
+                count = self.completions(target, next_states)[level]
+
+                if index < count:
+                    offset = target
+                    states = next_states
+                    bytestr += part
+                    break
+
+                index -= count
+
+        return bytestr
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'entries', 'bytes', 'maxsize', 'maxbytes'])
+
+
+class GraphCache:
+    """
+    Thread-safe least-recently-used cache of PackingGraph objects, bounded both by number of entries and by their approximate size in bytes.
+    """
+    def __init__(self, maxsize=1024, maxbytes=64 * 1024 * 1024):
+        self.lock = threading.Lock()
+        self.graphs = collections.OrderedDict()
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def get(self, value, bits, lengths):
+        key = (value, bits, lengths)
+
+        with self.lock:
+            if key in self.graphs:
+                self.hits += 1
+                self.graphs.move_to_end(key)
+                return self.graphs[key][0]
+
+            self.misses += 1
+
+        graph = PackingGraph(value, bits, lengths)
+        size = graph.approximate_size
+
+        with self.lock:
+            if key not in self.graphs:
+                self.graphs[key] = (graph, size)
+                self.bytes += size
+                self.evict()
+
+        return graph
+
+    def evict(self):
+        while self.graphs and (len(self.graphs) > self.maxsize or self.bytes > self.maxbytes):
+            graph, size = self.graphs.popitem(last=False)[1]
+            self.bytes -= size
+            self.evictions += 1
+
+    def configure(self, maxsize=None, maxbytes=None):
+        with self.lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+
+            if maxbytes is not None:
+                self.maxbytes = maxbytes
+
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.graphs.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, len(self.graphs), self.bytes, self.maxsize, self.maxbytes)
+
+
+graph_cache = GraphCache()
+
+
+def cache_info():
+    """
+    Return a CacheInfo(hits, misses, evictions, entries, bytes, maxsize, maxbytes) with statistics of the packing graph cache used by encoding functions.
+    """
+    return graph_cache.info()
+
+
+def configure_cache(maxsize=None, maxbytes=None):
+    """
+    Set the maximum number of entries and the maximum approximate size in bytes of the packing graph cache, evicting least-recently-used graphs as needed.
+    A maxsize of 0 disables caching.
+    """
+    graph_cache.configure(maxsize, maxbytes)
+
+
+def clear_cache():
+    """
+    Empty the packing graph cache and reset its statistics.
+    """
+    graph_cache.clear()
+
+
+def packing_graph(addr):
+    return graph_cache.get(int.from_bytes(addr.packed, 'big'), addr.max_prefixlen, tuple(utf8_lengths))
+
+
+def iter_packed_combinations(bits, lengths, shuffle=None):
+    return PackingGraph(bits_to_int(bits), len(bits), lengths).paths(shuffle)
+
+
 def packed_combinations(bits, lengths):
-    if not bits:
-        return [b'']
+    return list(iter_packed_combinations(bits, lengths))
 
-    bytestrs = []
 
-    for minimum, length in lengths:
-        if len(bits) < length:
-            continue
+ConstraintStat = collections.namedtuple('ConstraintStat', ['calls', 'passes', 'seconds', 'cost'])
 
-        val = int.from_bytes(bits_to_bytes(bits[:length]), 'big')
 
-        if minimum > 0 and val < (1 << minimum):
-            continue
+class ConstraintStats:
+    """
+    Thread-safe record of the run time and pass rate of confusion constraints evaluated by confusion_check, used to order the constraints of a level by the least expected cost of deciding it.
+    Only the constraints of one in every sample level evaluations are timed and recorded, and the order of each level is cached until rerank more constraint evaluations have been recorded, so that learning stays off the common path.
+    At most maxorders levels are cached at a time, so that passing new levels and constraints dicts to confusion_check does not grow the cache without bound.
+    Statistics are kept per constraint object in weak references, so that constraints of different constraints dicts never share them even if their names are equal, and discarded constraints are forgotten.
+    Constraints that have not been recorded yet are ordered first so that they are measured, and ties keep the order of the confusion level.
+    Cost is a moving average of run time that starts from the second recorded call, so that one-time setup such as building data tables in the first call is forgotten.
+    """
+    decay = 0.1
+    sample = 64
+    rerank = 16
+    maxorders = 1024
 
-        try:
-            part = chr(val).encode('utf-8')
-        except (ValueError, UnicodeEncodeError):
-            continue
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = weakref.WeakKeyDictionary()
+        self.orders = {}
+        self.recorded = 0
+
+    def run(self, candidate, constraint):
+        if constraint in candidate.results:
+            return candidate.results[constraint]
+
+        start = time.perf_counter()
+        result = candidate.satisfies(constraint)
+        elapsed = time.perf_counter() - start
 
-        for combination in packed_combinations(bits[length:], lengths):
+        with self.lock:
             try:
-                bytestr = part + combination
-                bytestr.decode('utf-8')
-                bytestrs.append(bytestr)
-            except UnicodeDecodeError:
-                continue
+                if constraint in self.stats:
+                    calls, passes, seconds, cost = self.stats[constraint]
+                    self.stats[constraint] = ConstraintStat(calls + 1, passes + result, seconds + elapsed, cost + self.decay * (elapsed - cost) if calls > 1 else elapsed)
+                else:
+                    self.stats[constraint] = ConstraintStat(1, int(result), elapsed, elapsed)
+                    self.orders = {}
+            except TypeError:
+                return result
+
+            self.recorded += 1
+            if self.recorded % self.rerank == 0:
+                self.orders = {}
+
+        return result
+
+    def stat(self, constraint):
+        try:
+            return self.stats.get(constraint)
+        except TypeError:
+            return None
+
+    def expected_cost(self, stats, required):
+        """
+        Expected run time of evaluating constraints with the given (cost, pass rate) pairs in order until required of them pass or can no longer pass, assuming they are independent.
+        """
+        remaining = len(stats)
+        undecided = {0: 1.0}
+        total = 0.0
+
+        for cost, rate in stats:
+            undecided = {satisfied: chance for satisfied, chance in undecided.items() if satisfied < required and satisfied + remaining >= required}
+            total += cost * sum(undecided.values())
+
+            following = collections.defaultdict(float)
+            for satisfied, chance in undecided.items():
+                following[satisfied + 1] += chance * rate
+                following[satisfied] += chance * (1 - rate)
+
+            undecided = following
+            remaining -= 1
+
+        return total
+
+    def rank(self, names, constraints, required):
+        stats = {}
+        unmeasured = []
 
-    return bytestrs
+        for name in names:
+            stat = self.stat(constraints[name])
+
+            if stat is None:
+                unmeasured.append(name)
+            else:
+                stats[name] = (stat.cost, (stat.passes + 1) / (stat.calls + 2))
+
+        measured = [name for name in names if name in stats]
+
+        if len(measured) <= 5:
+            best = min(itertools.permutations(measured), key=lambda order: self.expected_cost([stats[name] for name in order], required - len(unmeasured)))
+        else:
+            best = sorted(measured, key=lambda name: stats[name][0] / max(stats[name][1], 1 - stats[name][1]))
+
+        return tuple(unmeasured) + tuple(best)
+
+    def entry(self, key, confusion_level, constraints):
+        """
+        Return the cache entry [names, constraints, order, countdown] of a confusion level under key, ranking its constraints again if the entry is missing or stale.
+        The countdown is decremented by each evaluation of the level, which is timed and recorded when it reaches zero.
+        """
+        entry = self.orders.get(key)
+
+        if entry is None or entry[0] is not confusion_level['constraints'] or entry[1] is not constraints:
+            with self.lock:
+                if len(self.orders) >= self.maxorders:
+                    self.orders = {}
+
+                names = confusion_level['constraints']
+                unmeasured = any(self.stat(constraints[name]) is None for name in names)
+                entry = [names, constraints, self.rank(names, constraints, confusion_level['required']), 1 if unmeasured else self.sample]
+                self.orders[key] = entry
+
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+            self.orders = {}
+
+    def info(self, constraints):
+        with self.lock:
+            return {name: stat for name, stat in ((name, self.stat(constraint)) for name, constraint in constraints.items()) if stat is not None}
+
+
+constraint_stats = ConstraintStats()
+
+
+def constraint_info():
+    """
+    Return a dictionary mapping the name of every registered confusion constraint evaluated so far by confusion_check to a ConstraintStat(calls, passes, seconds, cost), where seconds is the total run time and cost the recent average run time of one call.
+    """
+    return constraint_stats.info(confusion_constraints)
+
+
+def constraint_order(level):
+    """
+    Return the names of the constraints of a confusion level in the order confusion_check currently evaluates them, learned from their observed run time and pass rate.
+    A ValueError is raised if the confusion level does not exist.
+    """
+    if level not in confusion_levels:
+        raise ValueError(f'unknown confusion level: {level}')
+
+    return constraint_stats.rank(confusion_levels[level]['constraints'], confusion_constraints, confusion_levels[level]['required'])
+
+
+def clear_constraint_stats():
+    """
+    Forget the observed run time and pass rate of every confusion constraint, restoring the order of each confusion level.
+    """
+    constraint_stats.clear()
 
 
 def confusion_check(bytestr, level, levels, constraints):
+    candidate = bytestr if isinstance(bytestr, Candidate) else Candidate(bytestr)
+    key = (id(levels), level)
+
+    if key in candidate.level_results:
+        return candidate.level_results[key]
+
     confusion_level = levels[level]
 
-    if not all(confusion_check(bytestr, inherited_level, levels, constraints) for inherited_level in confusion_level['inherit']):
-        return False
+    if all(confusion_check(candidate, inherited_level, levels, constraints) for inherited_level in confusion_level['inherit']):
+        entry = constraint_stats.orders.get(key)
+        if entry is None or entry[0] is not confusion_level['constraints'] or entry[1] is not constraints:
+            entry = constraint_stats.entry(key, confusion_level, constraints)
 
-    satisfied = 0
+        entry[3] -= 1
+        if entry[3]:
+            evaluate = Candidate.satisfies
+        else:
+            entry[3] = constraint_stats.sample
+            evaluate = constraint_stats.run
 
-    for constraint in confusion_level['constraints']:
-        if constraints[constraint](bytestr):
-            satisfied += 1
+        order = entry[2]
+        required = confusion_level['required']
+        remaining = len(order)
+        satisfied = 0
+
+        for constraint in order:
+            if satisfied >= required or satisfied + remaining < required:
+                break
+
+            remaining -= 1
+
+            if evaluate(candidate, constraints[constraint]):
+                satisfied += 1
+
+        result = satisfied >= required
+    else:
+        result = False
+
+    candidate.level_results[key] = result
+
+    return result
 
-    return satisfied >= confusion_level['required']
 
+def count_representations(addr):
+    """
+    Count the I-DUNNO packings of an ipaddress.IPv6Address or an ipaddress.IPv4Address object, regardless of confusion level.
+    """
+    return packing_graph(addr).path_count
+
+
+def count_valid(addr, level='minimum'):
+    """
+    Count the valid I-DUNNO representations of an ipaddress.IPv6Address or an ipaddress.IPv4Address object at the given confusion level.
+    encode(addr, level) samples uniformly from the same set.
+    A ValueError is raised if the confusion level does not exist.
+    """
+    return ConfusionSearch(packing_graph(addr), ConfusionPlan(level)).count()
 
-def encode(addr, level='minimum'):
+
+def can_encode(addr, level='minimum'):
+    """
+    Return whether an ipaddress.IPv6Address or an ipaddress.IPv4Address object has any valid I-DUNNO representation at the given confusion level.
+    Most infeasible levels are proven so from bounds on the characters reachable in the packing graph, without trying any candidate, and feasible ones stop at the first prefix that settles the level.
+    A ValueError is raised if the confusion level does not exist.
+    """
+    search = ConfusionSearch(packing_graph(addr), ConfusionPlan(level))
+
+    return next(search.regions(), None) is not None
+
+
+def canonical_order(edges):
+    edges.sort(key=lambda edge: edge[1])
+
+
+def address_rng(addr, seed):
+    return random.Random(f'{seed}:{addr}')
+
+
+def keyed_index(addr, key, count):
+    return int.from_bytes(hmac.new(key, addr.packed, hashlib.sha256).digest(), 'big') % count
+
+
+def encode(addr, level='minimum', index=None, rng=None, seed=None, key=None, objective='random', max_candidates=None, timeout=None):
     """
     Encode an ipaddress.IPv6Address or an ipaddress.IPv4Address object into a random, valid I-DUNNO representation at the given confusion level.
-    A ValueError is raised if valid I-DUNNO for the given arguments does not exist.
+    Every valid representation is equally likely to be returned, so that representations of the same address cannot be linked to each other.
+    If index is given, the packing at that position (from 0 to count_representations(addr) - 1) is returned instead of a random one.
+    Randomness is drawn from rng (a random.Random instance) if given, from a new random.Random seeded with both seed and the address if seed is given, so that the same address, level, and seed always give the same result, or from the global random module state otherwise.
+    If key is given, the representation is instead chosen by an HMAC-SHA256 of the address under that key, so the same address, level, and key always give the same result on any host.
+    If objective is 'canonical', the lexicographically smallest valid representation is returned, so equal addresses always give equal bytes.
+    If objective is 'shortest' or 'longest', the valid representation with the fewest or most bytes is returned, ties broken by the lexicographically smallest.
+    If objective is 'max-confusion', the valid representation that satisfies the most constraints across all confusion levels is returned, ties broken by the lexicographically smallest.
+    If max_candidates or timeout (in seconds) is given, a SearchBudgetExceeded error is raised once the search has examined that many partial candidates or run for that long.
+    Only one of index, key, and an objective other than 'random' may be given, and budgets cannot be given with index.
+    A ValueError is raised if valid I-DUNNO for the given arguments does not exist or incompatible arguments are given.
 
     The output of this function MAY be presented to humans, as recommended by RFC8771.
     """
-    if level not in confusion_levels:
-        raise ValueError(f'unknown confusion level: {level}')
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    if rng is not None and seed is not None:
+        raise ValueError('only one of rng and seed may be given')
+
+    if rng is None:
+        rng = random if seed is None else address_rng(addr, seed)
+
+    if objective not in ('random', 'canonical', 'shortest', 'longest', 'max-confusion'):
+        raise ValueError(f'unknown objective: {objective}')
+
+    modes = [name for name, given in (('index', index is not None), ('key', key is not None), ('objective', objective != 'random')) if given]
+
+    if len(modes) > 1:
+        raise ValueError(f'only one of {", ".join(modes)} may be given')
+
+    if index is not None and (max_candidates is not None or timeout is not None):
+        raise ValueError('max_candidates and timeout cannot be given with index')
+
+    if objective == 'max-confusion':
+        plan = ConfusionPlan(level, track=[constraint for confusion_level in confusion_levels.values() for constraint in confusion_level['constraints']])
+    else:
+        plan = ConfusionPlan(level)
+    graph = packing_graph(addr)
+
+    if index is not None:
+        bytestr = graph.unrank(index)
+
+        if not confusion_check(bytestr, level, confusion_levels, confusion_constraints):
+            raise ValueError(f'representation {index} of given address "{addr}" is not valid I-DUNNO at confusion level "{level}"')
+
+        return bytestr
+
+    search = ConfusionSearch(graph, plan, max_candidates, deadline)
+
+    if objective == 'canonical':
+        bytestr = search.first(canonical_order)
+    elif objective == 'max-confusion':
+        bytestr = search.maximum()
+    elif objective in ('shortest', 'longest'):
+        bytestr = search.optimum(min if objective == 'shortest' else max)
+    elif key is not None:
+        count = search.count()
+        bytestr = search.unrank(keyed_index(addr, key, count)) if count else None
+    else:
+        bytestr = search.sample(rng)
+
+    if bytestr is None:
+        raise ValueError(f'could not represent given address "{addr}" as valid I-DUNNO at confusion level "{level}"')
+
+    return bytestr
+
+
+def encode_all_levels(addr, rng=None, seed=None):
+    """
+    Encode an ipaddress.IPv6Address or an ipaddress.IPv4Address object into a random, valid I-DUNNO representation for every confusion level at once, with a single search.
+    A dict mapping each confusion level to its representation is returned, leaving out levels at which valid I-DUNNO does not exist.
+    Representations are counted by the last confusion level they reach in one pass over the packing graph, and each level is given a uniformly random representation that reaches no later level, falling back to one that does if there is none.
+    Randomness is drawn from rng or seed as in encode.
+
+    The output of this function MAY be presented to humans, as recommended by RFC8771.
+    """
+    if rng is not None and seed is not None:
+        raise ValueError('only one of rng and seed may be given')
+
+    if rng is None:
+        rng = random if seed is None else address_rng(addr, seed)
+
+    levels = list(confusion_levels)
+    plan = ConfusionPlan(levels[0], track=[constraint for confusion_level in confusion_levels.values() for constraint in confusion_level['constraints']])
+    graph = packing_graph(addr)
+
+    classes = None if plan.opaque else ConfusionSearch(graph, plan).classify([plan.requirements(level) for level in levels])
+
+    representations = {}
+
+    for idx, level in enumerate(levels):
+        if classes is None:
+            bytestr = ConfusionSearch(graph, ConfusionPlan(level)).sample(rng)
+        elif classes.counts[idx]:
+            bytestr = classes.unrank(idx, rng.randrange(classes.counts[idx]))
+        elif any(classes.counts[later] for later in range(idx + 1, len(levels))):
+            bytestr = ConfusionSearch(graph, ConfusionPlan(level)).sample(rng)
+        else:
+            bytestr = None
+
+        if bytestr is not None:
+            representations[level] = bytestr
+
+    return representations
+
+
+def encode_many(addrs, level='minimum', seed=None):
+    """
+    Encode an iterable of ipaddress.IPv6Address or ipaddress.IPv4Address objects, or of anything else ipaddress.ip_address() accepts such as strings, into uniformly random, valid I-DUNNO representations at the given confusion level.
+    An EncodeResult(addr, i_dunno, error) is lazily yielded for each address in input order, where error holds the ValueError for an address that could not be parsed or encoded instead of it being raised.
+    If seed is given, each address is encoded with its own random.Random seeded with both seed and the address, so its result is the same as that of encode with the same level and seed, wherever it is in the batch.
+    A ValueError is raised immediately if the confusion level does not exist.
+
+    The output of this function MAY be presented to humans, as recommended by RFC8771.
+    """
+    plan = ConfusionPlan(level)
+    rng = random.Random()
+
+    def results():
+        for item in addrs:
+            try:
+                addr = ipaddress.ip_address(item)
+            except ValueError as error:
+                yield EncodeResult(item, None, error)
+                continue
+
+            bytestr = ConfusionSearch(packing_graph(addr), plan).sample(rng if seed is None else address_rng(addr, seed))
+
+            if bytestr is None:
+                yield EncodeResult(addr, None, ValueError(f'could not represent given address "{addr}" as valid I-DUNNO at confusion level "{level}"'))
+            else:
+                yield EncodeResult(addr, bytestr, None)
+
+    return results()
+
+
+def init_worker(levels, constraints):
+    for name, constraint in constraints.items():
+        confusion_constraints.setdefault(name, constraint)
+
+    for name, confusion_level in levels.items():
+        confusion_levels.setdefault(name, confusion_level)
+
+    data.code_point_table()
+
+    for name in ('confusables', 'emoji'):
+        data_matcher(name)
+
+
+def encode_chunk(addrs, level, seed):
+    return list(encode_many(addrs, level, seed))
+
+
+def chunk_results(chunk, future):
+    try:
+        return future.result()
+    except Exception as error:
+        return [EncodeResult(addr, None, error) for addr in chunk]
+
+
+def encode_parallel(addrs, level='minimum', seed=None, jobs=None, chunksize=256):
+    """
+    Encode an iterable of ipaddress.IPv6Address or ipaddress.IPv4Address objects like encode_many, but split into chunks across a pool of jobs worker processes (by default or if jobs is 0, one per CPU).
+    Each worker builds the data tables once when it starts, and only a bounded number of chunks are in flight at a time, so the input is consumed lazily and results are yielded in input order.
+    The confusion level and the levels and constraints it depends on are sent to each worker, so that registered levels can be used with any multiprocessing start method, but outside of the fork start method their constraints must be picklable (for example, module-level functions rather than lambdas).
+    If a chunk fails in its worker, an EncodeResult with that error is yielded for each of its addresses instead of it being raised.
+    If seed is given, the results are the same as those of encode_many, regardless of the number of jobs and the chunksize.
+    A ValueError is raised immediately if the confusion level does not exist or cannot be sent to workers, or jobs is negative.
+
+    The output of this function MAY be presented to humans, as recommended by RFC8771.
+    """
+    plan = ConfusionPlan(level)
+
+    if jobs is not None and jobs < 0:
+        raise ValueError(f'job count must not be negative: {jobs}')
+
+    levels = {name: confusion_levels[name] for name in plan.closure(level)}
+    constraints = {name: confusion_constraints[name] for name in plan.names}
+
+    if multiprocessing.get_start_method() != 'fork':
+        try:
+            pickle.dumps((levels, constraints))
+        except (pickle.PicklingError, AttributeError, TypeError) as error:
+            raise ValueError(f'confusion level "{level}" cannot be sent to worker processes: {error}')
+
+    addrs = iter(addrs)
+    jobs = jobs or os.cpu_count() or 1
+
+    def results():
+        with concurrent.futures.ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(levels, constraints)) as executor:
+            pending = collections.deque()
+
+            while True:
+                chunk = list(itertools.islice(addrs, chunksize))
+                if not chunk:
+                    break
 
-    bits = bytes_to_bits(addr.packed)
+                pending.append((chunk, executor.submit(encode_chunk, chunk, level, seed)))
 
-    bytestrs = packed_combinations(tuple(bits), tuple(utf8_lengths))
-    random.shuffle(bytestrs)
+                if len(pending) >= 2 * jobs:
+                    yield from chunk_results(*pending.popleft())
 
-    for bytestr in bytestrs:
-        if confusion_check(bytestr, level, confusion_levels, confusion_constraints):
-            return bytestr
+            while pending:
+                yield from chunk_results(*pending.popleft())
 
-    raise ValueError(f'could not represent given address "{addr}" as valid I-DUNNO at confusion level "{level}"')
+    return results()
 
 
 def decode(i_dunno):
@@ -141,19 +1695,21 @@ def decode(i_dunno):
 
     The output of this function SHOULD NOT be presented to humans, as recommended by RFC8771.
     """
-    bits = []
+    value = 0
+    bits = 0
 
     for char in i_dunno.decode('utf-8'):
         num = ord(char)
 
         for minimum, length in utf8_lengths:
             if num < (1 << length) and (minimum == 0 or num >= (1 << minimum)):
-                bits += int_to_bits(num, length)
+                value = (value << length) | num
+                bits += length
                 break
         else:
             raise ValueError('invalid I-DUNNO')
 
-    addr = bits_to_bytes(bits)
+    addr = value.to_bytes((bits + 7) // 8, 'big')
 
     if len(addr) == 16:
         cls = ipaddress.IPv6Address
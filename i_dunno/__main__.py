@@ -2,22 +2,45 @@ import argparse
 import ipaddress
 import sys
 
-from . import encode
+from . import confusion_levels, encode_many, encode_parallel
+
+
+def job_count(value):
+    jobs = int(value)
+
+    if jobs < 0:
+        raise argparse.ArgumentTypeError(f'job count must not be negative: {value}')
+
+    return jobs
 
 
 def main():
     argparser = argparse.ArgumentParser(description='convert IPv6 or IPv4 addresses into RFC8771-compliant I-DUNNO representation')
-    argparser.add_argument('-l', '--confusion-level', default='minimum', choices=['minimum', 'satisfactory', 'delightful'], dest='level', help='desired confusion level of I-DUNNO representation')
-    argparser.add_argument('addr', type=ipaddress.ip_address, help='IPv6 or IPv4 address in standard notation')
+    argparser.add_argument('-l', '--confusion-level', default='minimum', choices=list(confusion_levels), dest='level', help='desired confusion level of I-DUNNO representation')
+    argparser.add_argument('-s', '--seed', type=int, help='seed for reproducible I-DUNNO representations')
+    argparser.add_argument('-j', '--jobs', type=job_count, default=1, help='number of worker processes to encode multiple addresses with (0 for one per CPU)')
+    argparser.add_argument('addrs', nargs='+', type=ipaddress.ip_address, metavar='addr', help='IPv6 or IPv4 address in standard notation')
 
     args = argparser.parse_args()
 
-    try:
-        sys.stdout.buffer.write(encode(args.addr, args.level))
-        if sys.stdout.isatty():
+    if args.jobs == 1:
+        results = encode_many(args.addrs, args.level, args.seed)
+    else:
+        results = encode_parallel(args.addrs, args.level, args.seed, args.jobs)
+
+    failed = False
+
+    for result in results:
+        if result.error:
+            print(f'Error: {result.error}', file=sys.stderr)
+            failed = True
+        else:
+            sys.stdout.buffer.write(result.i_dunno)
+
+        if len(args.addrs) > 1 or (not result.error and sys.stdout.isatty()):
             sys.stdout.buffer.write(b'\n')
-    except ValueError as err:
-        print(f'Error: {err}', file=sys.stderr)
+
+    if failed:
         sys.exit(1)
 
 
@@ -1,4 +1,10 @@
-__all__ = ['idna_disallowed', 'category_symbols', 'character_script', 'character_bidi', 'confusables', 'emoji']
+import array
+import bisect
+import collections
+import functools
+
+
+__all__ = ['idna_disallowed', 'category_symbols', 'character_script', 'character_script_id', 'script_names', 'character_bidi', 'character_bidi_id', 'bidi_names', 'confusables', 'emoji', 'code_point_table']
 
 
 idna_disallowed = {
@@ -894,6 +900,40 @@ category_symbols = {
 }
 
 
+def interval_table(ranges, default):
+    names = [default] + sorted(set(ranges.values()) - {default})
+    ids = {name: idx for idx, name in enumerate(names)}
+
+    lowers = array.array('I')
+    uppers = array.array('I')
+    values = array.array('B')
+
+    for (lower, upper), name in sorted(ranges.items()):
+        if name == default:
+            continue
+
+        if values and values[-1] == ids[name] and uppers[-1] + 1 == lower:
+            uppers[-1] = upper
+            continue
+
+        lowers.append(lower)
+        uppers.append(upper)
+        values.append(ids[name])
+
+    return lowers, uppers, values, tuple(names)
+
+
+def interval_lookup(table, num):
+    lowers, uppers, values, names = table
+
+    idx = bisect.bisect_right(lowers, num) - 1
+
+    if idx >= 0 and num <= uppers[idx]:
+        return values[idx]
+
+    return 0
+
+
 scripts = {
     (0x0000, 0x001f): 'Common', (0x0020, 0x0020): 'Common', (0x0021, 0x0023): 'Common', (0x0024, 0x0024): 'Common',
     (0x0025, 0x0027): 'Common', (0x0028, 0x0028): 'Common', (0x0029, 0x0029): 'Common', (0x002a, 0x002a): 'Common',
@@ -1422,14 +1462,16 @@ scripts = {
 }
 
 
-def character_script(char):
-    num = ord(char)
+script_table = interval_table(scripts, 'Unknown')
+script_names = script_table[3]
 
-    for (lower, upper), script in scripts.items():
-        if num >= lower and num <= upper:
-            return script
 
-    return 'Unknown'
+def character_script_id(char):
+    return interval_lookup(script_table, ord(char))
+
+
+def character_script(char):
+    return script_names[character_script_id(char)]
 
 
 bidi_classes = {
@@ -2001,14 +2043,16 @@ bidi_classes = {
 }
 
 
-def character_bidi(char):
-    num = ord(char)
+bidi_table = interval_table(bidi_classes, 'ON')
+bidi_names = bidi_table[3]
 
-    for (lower, upper), cls in bidi_classes.items():
-        if num >= lower and num <= upper:
-            return cls
 
-    return 'ON'
+def character_bidi_id(char):
+    return interval_lookup(bidi_table, ord(char))
+
+
+def character_bidi(char):
+    return bidi_names[character_bidi_id(char)]
 
 
 confusables = {
@@ -3494,3 +3538,46 @@ emoji = {
     '\u27a1\ufe0f', '\u27b0', '\u27bf', '\u2934\ufe0f', '\u2935\ufe0f', '\u2b05\ufe0f', '\u2b06\ufe0f', '\u2b07\ufe0f',
     '\u2b1b', '\u2b1c', '\u2b50', '\u2b55', '\u3030\ufe0f', '\u303d\ufe0f', '\u3297\ufe0f', '\u3299\ufe0f',
 }
+
+
+MULTI_OCTET = 0x01
+DISALLOWED = 0x02
+SYMBOL = 0x04
+NON_PRINTABLE = 0x08
+
+
+CodePointTable = collections.namedtuple('CodePointTable', ['flags', 'scripts', 'script_names', 'bidi', 'bidi_names'])
+
+
+def range_table(table):
+    lowers, uppers, values, names = table
+
+    ids = array.array('B', [0]) * 0x110000
+
+    for lower, upper, value in zip(lowers, uppers, values):
+        ids[lower:upper + 1] = array.array('B', [value]) * (upper - lower + 1)
+
+    return ids, names
+
+
+@functools.lru_cache(maxsize=None)
+def code_point_table():
+    flags = bytearray(0x110000)
+    flags[0x80:] = bytes([MULTI_OCTET]) * (0x110000 - 0x80)
+
+    for char in idna_disallowed:
+        if len(char) == 1:
+            flags[ord(char)] |= DISALLOWED
+
+    for char in category_symbols:
+        if len(char) == 1:
+            flags[ord(char)] |= SYMBOL
+
+    for num in range(0x110000):
+        if not chr(num).isprintable():
+            flags[num] |= NON_PRINTABLE
+
+    script_ids, script_names = range_table(script_table)
+    bidi_ids, bidi_names = range_table(bidi_table)
+
+    return CodePointTable(flags, script_ids, script_names, bidi_ids, bidi_names)